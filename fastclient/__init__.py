@@ -1,19 +1,27 @@
 import contextlib
 from collections import defaultdict
-from multiprocessing import JoinableQueue, Lock, Manager, Process, Value
+from multiprocessing import Barrier, JoinableQueue, Lock, Manager, Process, Value
 from multiprocessing.connection import Connection, Pipe
 from multiprocessing.connection import wait as wait_for_connection
+from math import ceil
 from queue import Empty
 from random import randint
-from time import time
+from threading import BrokenBarrierError, Event, Thread
+from time import sleep, time
 from typing import Any, Callable, Iterable, List, Mapping
 
+from fastclient.coordinator import Address, LeaseClient
+from fastclient.dns import DNSCache
 from fastclient.errors import StoreNotSupportedError, NoListenersError
+from fastclient.journal import Journal
 from fastclient.pools import RequestPool
 from fastclient.types import Request, RequestEvent, Response
 
 # TODO parameters (rate) and context dicts passed to callbacks
 
+# the time (in seconds) to wait for all controllers to set up their pools before creating tickets
+_SETUP_TIMEOUT = 60
+
 
 class FastClient():
     """Wicked-fast API-client that supports rate-limiting, proxy rotation, token rotation and multiprocessing."""
@@ -25,7 +33,14 @@ class FastClient():
                  num_pools: int = 8,
                  max_connections: int = None,
                  use_store: bool = True,
-                 use_rps: bool = True) -> None:
+                 use_rps: bool = True,
+                 use_dns_cache: bool = True,
+                 dns_ttl: float = 60,
+                 coordinator: Address = None,
+                 limiter: str = 'default',
+                 authkey: bytes = None,
+                 fallback_rate: float = None,
+                 journal: str = None) -> None:
         self._rate = rate
         self._pools = pools
         # TODO rate limited token queue
@@ -33,14 +48,22 @@ class FastClient():
         self._max_connections = max_connections or self._rate
         self._use_store = use_store
         self._use_rps = use_rps
+        self._use_dns_cache = use_dns_cache
+        self._coordinator = coordinator
+        self._limiter = limiter
+        self._authkey = authkey
+        self._fallback_rate = fallback_rate
+        self._journal = Journal(journal).load() if journal else None
 
         self._requests = JoinableQueue()
 
-        self._ctx_manager = Manager() if self._use_store or self._use_rps else None
+        self._ctx_manager = Manager() if self._use_store or self._use_rps or self._use_dns_cache else None
 
         self._store = self._ctx_manager.dict() if self._use_store else None
         self._store_lock = self._ctx_manager.Lock() if self._use_store else None
 
+        self._dns_cache = DNSCache(self._ctx_manager.dict(), dns_ttl) if self._use_dns_cache else None
+
         self._callbacks = defaultdict(list)
         self._callback_registered = False
 
@@ -66,6 +89,9 @@ class FastClient():
         self._callback_registered = True
 
     def request(self, request: Request):
+        # raises a ValueError for ids the journal can't hold
+        if self._journal is not None and request.id is not None and self._journal.is_completed(request.id):
+            return
         self._requests.put(request)
 
     def run(self):
@@ -96,6 +122,8 @@ class FastClient():
         # create ticket connections
         connections = [Pipe() for _ in range(len(pools)+len(poolgroups))]
         ticket_recvs, ticket_sends = ([i for i, _ in connections], [j for _, j in connections])
+        # lets the controllers set up their pools before any tickets are created
+        ready = Barrier(len(connections) + 1)
         del connections
 
         # create their controllers
@@ -105,7 +133,7 @@ class FastClient():
                 args=((pool,),
                       self._num_pools, self._max_connections, self._requests, ticket_recvs.pop(),
                       self._callbacks, self._use_store, self._store_lock, self._store, self._use_rps,
-                      rps_send, rps, rps10, rps1),
+                      rps_send, rps, rps10, rps1, self._dns_cache, self._journal, ready),
                       daemon=True) for pool in pools)
         del pools
 
@@ -115,7 +143,8 @@ class FastClient():
                 target=FastClient._controller,
                 args=(tuple(poolgroup),
                       self._num_pools, self._max_connections, self._requests, ticket_recvs.pop(),
-                      self._callbacks, self._use_store, self._store_lock, self._store, self._use_rps, rps_send, rps, rps10, rps1),
+                      self._callbacks, self._use_store, self._store_lock, self._store, self._use_rps, rps_send, rps, rps10, rps1,
+                      self._dns_cache, self._journal, ready),
                       daemon=True)
             for poolgroup in poolgroups.values())
         del poolgroups
@@ -133,21 +162,39 @@ class FastClient():
                 daemon=True)
             rps_counter.start()
 
-        # start ticket creation
         tickets = Process(name='FastClient-ticket-manager',
-                          target=FastClient._create_tickets, args=(self._rate, ticket_sends),
+                          target=FastClient._create_tickets,
+                          args=(self._rate, ticket_sends, self._coordinator, self._limiter, self._authkey,
+                                self._fallback_rate),
                           daemon=True)
-        tickets.start()
 
-        # now all the processing happens...
+        # merge the journal into the index from time to time, so a crash only leaves a short journal to replay
+        if self._journal is not None:
+            checkpoints_stop = Event()
+            checkpoints = Thread(name='FastClient-checkpoints', target=FastClient._checkpoint,
+                                 args=(self._journal, checkpoints_stop), daemon=True)
+            checkpoints.start()
 
-        # wait for request queue to be empty
         self._requests.close()
         try:
+            # start ticket creation once the controllers are set up, but don't wait forever for a stuck one
+            with contextlib.suppress(BrokenBarrierError):
+                ready.wait(_SETUP_TIMEOUT)
+            tickets.start()
+
+            # now all the processing happens...
+
+            # wait for request queue to be empty
             self._requests.join()
         except KeyboardInterrupt as e:
             for controller in controllers:
                 controller.terminate()
+            for controller in controllers:
+                controller.join()
+            if self._journal is not None:
+                checkpoints_stop.set()
+                checkpoints.join()
+                self._journal.checkpoint()
             raise e
 
         # stop ticket creation
@@ -158,6 +205,11 @@ class FastClient():
         for controller in controllers:
             controller.join()
 
+        if self._journal is not None:
+            checkpoints_stop.set()
+            checkpoints.join()
+            self._journal.checkpoint()
+
         if self._use_rps:
             rps_counter.terminate()
             rps_counter.join()
@@ -169,11 +221,19 @@ class FastClient():
             num_pools: int, max_connections: int, requests: JoinableQueue, tickets: Connection,
             callbacks: Mapping[RequestEvent, Callable],
             use_store: bool, store_lock: Lock, store: Mapping[str, Any],
-            use_rps: bool, rps_send: Connection, rps: Value, rps10: Value, rps1: Value):
+            use_rps: bool, rps_send: Connection, rps: Value, rps10: Value, rps1: Value,
+            dns_cache: DNSCache, journal: Journal, ready: Barrier):
         count = 0
         last_time = 0
         id_ = randint(1, 99)
-        connections = [pool._setup(num_pools, max_connections) for pool in pools]
+        if dns_cache is not None:
+            dns_cache.install()
+        try:
+            connections = [pool._setup(num_pools, max_connections) for pool in pools]
+        finally:
+            # a failed setup must not keep the other controllers from starting
+            with contextlib.suppress(BrokenBarrierError):
+                ready.wait()
         counter = 0
         try:
             while True:
@@ -201,6 +261,8 @@ class FastClient():
                         if type(result) == Response:
                             for callback in callbacks[RequestEvent.RESPONSE]:
                                 callback(result, context)
+                            if journal is not None and result.id is not None:
+                                journal.completed(result.id)
                         else:
                             for callback in callbacks[RequestEvent.ERROR]:
                                 callback(result, context)
@@ -210,7 +272,11 @@ class FastClient():
                     print(f'controller {id_}: {count}/s')
                     last_time = time()
                     count = 0
+                    if journal is not None:
+                        journal.flush()
         finally:
+            if journal is not None:
+                journal.close()
             for pool in pools:
                 pool._teardown()
             for connection in connections:
@@ -219,15 +285,58 @@ class FastClient():
             rps_send.close()
 
     @staticmethod
-    def _create_tickets(rate: float, connections: List[Connection]):
+    def _create_tickets(rate: float, connections: List[Connection],
+                        coordinator: Address = None, limiter: str = None, authkey: bytes = None,
+                        fallback_rate: float = None):
         with contextlib.suppress(KeyboardInterrupt):
-            last_tickets = 0
-            while True:
-                time_ = time()
-                if time_ - last_tickets > 1 / rate:
-                    for connection in connections:
-                        connection.send(None)
-                    last_tickets = time_
+            if coordinator is None:
+                last_tickets = 0
+                while True:
+                    time_ = time()
+                    if time_ - last_tickets > 1 / rate:
+                        for connection in connections:
+                            connection.send(None)
+                        last_tickets = time_
+
+            client = LeaseClient(coordinator, limiter, rate, authkey=authkey, fallback_rate=fallback_rate)
+            lease_id, unused = None, 0
+            try:
+                while True:
+                    lease = client.lease()
+                    if lease is None:
+                        if not client.fallback_rate:
+                            # no local limit to fall back to, wait for the coordinator
+                            sleep(client.retry_interval)
+                            continue
+                        # coordinator unreachable, fall back to the local limit until the next attempt
+                        lease_id, interval = None, 1 / client.fallback_rate
+                        granted = ceil(client.fallback_rate * client.retry_interval)
+                    else:
+                        lease_id, granted, _, wait = lease
+                        interval = 1 / rate
+                        if not granted:
+                            sleep(max(wait, interval))
+                            continue
+                    # spend the lease evenly, never exceeding the local rate
+                    start = time()
+                    for i in range(granted):
+                        unused = granted - i
+                        delay = start + i * interval - time()
+                        if delay > 0:
+                            sleep(delay)
+                        for connection in connections:
+                            connection.send(None)
+                    unused = 0
+            finally:
+                # give back what's left when interrupted, so other nodes can use it right away
+                if lease_id is not None and unused:
+                    client.release(lease_id, unused)
+                client.close()
+
+    @staticmethod
+    def _checkpoint(journal: Journal, stop: Event):
+        while not stop.wait(journal.checkpoint_interval):
+            journal.checkpoint()
 
     @staticmethod
     def _count_rps(rps_recv: Connection, rps: Value, rps10: Value, rps1: Value):
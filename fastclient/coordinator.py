@@ -0,0 +1,372 @@
+import contextlib
+import socket
+import struct
+from collections import defaultdict
+from ipaddress import ip_address
+from itertools import count
+from math import ceil
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener, answer_challenge, deliver_challenge
+from threading import Lock, Thread
+from time import time
+from typing import List, Mapping, Tuple, Union
+
+Address = Union[str, Tuple[str, int]]
+
+# the time (in seconds) a peer gets to complete the authentication handshake
+_HANDSHAKE_TIMEOUT = 1
+
+
+class Coordinator:
+    """Hands out rate-limit tokens in bulk leases to any number of :class:`FastClient` processes or hosts."""
+
+    def __init__(self,
+                 address: Address = ('localhost', 0),
+                 rates: Mapping[str, float] = None,
+                 *,
+                 lease_time: float = 0.1,
+                 authkey: bytes = None) -> None:
+        """
+        Initialise a Coordinator.
+
+        Parameters
+        ----------
+        address : str | tuple[str, int], default=('localhost', 0)
+            A ``(host, port)`` tuple for a TCP socket or a path for a unix socket.
+        rates : Mapping[str, float], default=None
+            The rate of each limiter. Limiters not listed here adopt the rate declared by the first client.
+        lease_time : float, default=0.1
+            The time (in seconds) a lease is valid for. Also determines the largest possible burst.
+        authkey : bytes, default=None
+            The key clients have to authenticate with. Required unless listening on a loopback address or a unix socket.
+
+        Raises
+        ------
+        ValueError
+            If no authkey is given for a non-loopback address.
+        """
+
+        if authkey is None and not _is_local(address):
+            # messages are unpickled, so an unauthenticated peer could execute arbitrary code
+            raise ValueError(f'An authkey is required to listen on {address}')
+
+        self.lease_time = lease_time
+        self._rates = dict(rates or {})
+        self._tokens = {}
+        self._last_refill = {}
+        self._leases = defaultdict(dict)
+        self._lease_ids = count()
+        self._lock = Lock()
+        self._authkey = authkey
+        # authentication happens in the client's thread, so a silent peer can't block accepting others
+        self._listener = Listener(address)
+        self._address = self._listener.address
+        self._thread = None
+        self._closed = False
+        self._conns = set()
+
+    @property
+    def address(self) -> Address:
+        """The address the coordinator is listening on."""
+        return self._address
+
+    def start(self) -> 'Coordinator':
+        """Start serving in a background thread."""
+        self._thread = Thread(name='FastClient-coordinator', target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Accept clients until :meth:`close` is called."""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # the listener was closed
+                return
+            if self._closed:
+                conn.close()
+                return
+            with self._lock:
+                self._conns.add(conn)
+            Thread(name='FastClient-coordinator-client', target=self._serve, args=(conn,), daemon=True).start()
+
+    def close(self):
+        """Stop accepting clients and disconnect the connected ones."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            # a blocking accept isn't interrupted by closing the listener, so wake it up
+            with contextlib.suppress(OSError):
+                Client(self.address).close()
+            self._thread.join()
+        self._listener.close()
+        with self._lock:
+            conns = list(self._conns)
+        for conn in conns:
+            # shutting the socket down wakes up the thread blocked on it, which then closes the connection
+            with contextlib.suppress(OSError):
+                sock = socket.socket(fileno=conn.fileno())
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.detach()
+
+    def _serve(self, conn: Connection):
+        try:
+            if self._authkey is not None:
+                with _recv_timeout(conn, _HANDSHAKE_TIMEOUT):
+                    deliver_challenge(conn, self._authkey)
+                    answer_challenge(conn, self._authkey)
+            while True:
+                try:
+                    command, *args = conn.recv()
+                    if command == 'lease':
+                        conn.send(self._lease(conn, *args))
+                    elif command == 'release':
+                        self._release(conn, *args)
+                except (EOFError, OSError):
+                    raise
+                except Exception:
+                    # drop malformed messages
+                    continue
+        except (EOFError, OSError, AuthenticationError):
+            pass
+        finally:
+            with self._lock:
+                self._conns.discard(conn)
+            self._recover(conn)
+            conn.close()
+
+    def _refill(self, name: str, rate: float, now: float):
+        # tokens accumulate at the limiter's rate, but never more than one lease window's worth
+        tokens = self._tokens.get(name, 0.0) + (now - self._last_refill.get(name, now)) * rate
+        self._tokens[name] = min(tokens, self._burst(rate))
+        self._last_refill[name] = now
+
+    def _burst(self, rate: float) -> float:
+        return max(1.0, rate * self.lease_time)
+
+    def _lease(self, conn: Connection, name: str, rate: float, n: int) -> Tuple[int, int, float, float]:
+        if not isinstance(n, int) or n < 1 or not rate > 0:
+            raise ValueError('Invalid lease request')
+        with self._lock:
+            rate = self._rates.setdefault(name, rate)
+            now = time()
+            if name not in self._tokens:
+                self._tokens[name] = self._burst(rate)
+                self._last_refill[name] = now
+            else:
+                self._refill(name, rate, now)
+            granted = min(n, int(self._tokens[name]))
+            self._tokens[name] -= granted
+            lease_id = next(self._lease_ids)
+            leases = self._leases[conn]
+            # forget leases that have run out, their tokens are spent
+            for id_ in [id_ for id_, (*_, deadline) in leases.items() if deadline < now]:
+                del leases[id_]
+            if granted:
+                leases[lease_id] = (name, granted, now + self.lease_time)
+            # the time until the next token is available
+            wait = max(0.0, (1 - self._tokens[name]) / rate)
+            return lease_id, granted, self.lease_time, wait
+
+    def _release(self, conn: Connection, lease_id: int, unused: int):
+        with self._lock:
+            lease = self._leases[conn].pop(lease_id, None)
+            if lease is None or lease[2] < time():
+                return
+            name, granted, _ = lease
+            self._credit(name, max(0, min(unused, granted)))
+
+    def _recover(self, conn: Connection):
+        """Give back the tokens of a disconnected client's unexpired leases."""
+        with self._lock:
+            now = time()
+            for name, granted, deadline in self._leases.pop(conn, {}).values():
+                if deadline > now:
+                    # clients spend their leases evenly, so this is the share that wasn't used yet
+                    self._credit(name, int(granted * (deadline - now) / self.lease_time))
+
+    def _credit(self, name: str, tokens: int):
+        rate = self._rates[name]
+        self._refill(name, rate, time())
+        self._tokens[name] = min(self._tokens[name] + tokens, self._burst(rate))
+
+
+class LeaseClient:
+    """Leases tokens for one limiter from a :class:`Coordinator`."""
+
+    def __init__(self,
+                 address: Address,
+                 name: str,
+                 rate: float,
+                 *,
+                 authkey: bytes = None,
+                 timeout: float = 0.25,
+                 retry_interval: float = 1,
+                 fallback_rate: float = None) -> None:
+        """
+        Initialise a LeaseClient.
+
+        Parameters
+        ----------
+        address : str | tuple[str, int]
+            The address of the coordinator.
+        name : str
+            The name of the limiter to lease tokens from.
+        rate : float
+            The maximum local rate. Also declares the limiter's rate if the coordinator doesn't know it yet.
+        authkey : bytes, default=None
+            The key to authenticate with.
+        timeout : float, default=0.25
+            The time (in seconds) to wait for the coordinator to connect or answer. No tickets are sent meanwhile.
+        retry_interval : float, default=1
+            The time (in seconds) to wait before reconnecting after the coordinator was unreachable.
+        fallback_rate : float, default=None
+            The local rate to use while the coordinator is unreachable, usually this node's share of the limiter's
+            rate. If None, no tokens are handed out until the coordinator is reachable again.
+        """
+
+        self.address = address
+        self.name = name
+        self.rate = rate
+        self.authkey = authkey
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.fallback_rate = fallback_rate
+        self._lease_time = 1
+        self._conn = None
+        self._last_failure = None
+
+    def lease(self) -> Union[Tuple[int, int, float, float], None]:
+        """
+        Lease tokens for the next window.
+
+        Returns
+        -------
+        tuple[int, int, float, float] | None
+            The lease's id, the number of granted tokens, the lease time and the time until more tokens are available,
+            or None if the coordinator is unreachable.
+        """
+
+        try:
+            conn = self._connect()
+            if conn is None:
+                return None
+            conn.send(('lease', self.name, self.rate, max(1, ceil(self.rate * self._lease_time))))
+            if not conn.poll(self.timeout):
+                raise TimeoutError
+            lease_id, granted, self._lease_time, wait = conn.recv()
+            return lease_id, granted, self._lease_time, wait
+        except (EOFError, OSError, AuthenticationError):
+            self._fail()
+            return None
+
+    def release(self, lease_id: int, unused: int):
+        """Give back the unused tokens of a lease."""
+        if self._conn is None:
+            return
+        try:
+            self._conn.send(('release', lease_id, unused))
+        except OSError:
+            self._fail()
+
+    def close(self):
+        """Close the connection to the coordinator."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self) -> Union[Connection, None]:
+        if self._conn is None:
+            if self._last_failure is not None and time() - self._last_failure < self.retry_interval:
+                return None
+            self._conn = self._open()
+            self._last_failure = None
+        return self._conn
+
+    def _open(self) -> Connection:
+        # Client() connects without a timeout, which would stall the tickets if the coordinator's host is down
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection(self.address, self.timeout)
+        sock.settimeout(None)
+        conn = Connection(sock.detach())
+        if self.authkey is not None:
+            try:
+                with _recv_timeout(conn, self.timeout):
+                    answer_challenge(conn, self.authkey)
+                    deliver_challenge(conn, self.authkey)
+            except BaseException:
+                conn.close()
+                raise
+        return conn
+
+    def _fail(self):
+        self.close()
+        self._last_failure = time()
+
+
+@contextlib.contextmanager
+def _recv_timeout(conn: Connection, timeout: float):
+    # Connection reads the raw fd, which breaks with a non-blocking socket, so limit blocking reads instead
+    sock = socket.socket(fileno=conn.fileno())
+    try:
+        seconds = int(timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO,
+                        struct.pack('ll', seconds, int((timeout - seconds) * 1e6)))
+        yield
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack('ll', 0, 0))
+    finally:
+        sock.detach()
+
+
+def _is_local(address: Address) -> bool:
+    if isinstance(address, str):
+        return True
+    host = address[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _parse_address(address: str) -> Address:
+    host, _, port = address.rpartition(':')
+    return (host or 'localhost', int(port)) if port.isdigit() else address
+
+
+def main(argv: List[str] = None):
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser('python -m fastclient.coordinator', description='Run a FastClient rate-limit coordinator.')
+    parser.add_argument('address', help='host:port to listen on, or a path for a unix socket')
+    parser.add_argument('--rate', action='append', default=[], metavar='NAME=RATE', help='the rate of a limiter')
+    parser.add_argument('--lease-time', type=float, default=0.1)
+    parser.add_argument('--authkey', help='required unless listening on a loopback address or a unix socket')
+    args = parser.parse_args(argv)
+
+    rates = {name: float(rate) for name, _, rate in (r.partition('=') for r in args.rate)}
+    try:
+        coordinator = Coordinator(_parse_address(args.address), rates, lease_time=args.lease_time,
+                                  authkey=args.authkey.encode() if args.authkey else None)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f'coordinator listening on {coordinator.address}')
+    try:
+        coordinator.serve_forever()
+    except KeyboardInterrupt:
+        coordinator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import socket
+from time import time
+from typing import MutableMapping, Tuple
+
+from urllib3.util import connection
+from urllib3.util.ssl_ import is_ipaddress
+
+_create_connection = connection.create_connection
+
+
+class DNSCache:
+    """A DNS cache for urllib3 that can be shared between processes."""
+
+    def __init__(self, store: MutableMapping[str, Tuple[float, Tuple[str, ...]]] = None, ttl: float = 60):
+        """
+        Initialise a DNSCache.
+
+        Parameters
+        ----------
+        store : MutableMapping[str, tuple[float, tuple[str, ...]]], default=None
+            The mapping to keep the resolved addresses in. Pass a managed dict to share them between processes.
+        ttl : float, default=60
+            The time (in seconds) a resolved address is kept for.
+        """
+
+        self.ttl = ttl
+        self._store = {} if store is None else store
+        self._local = {}
+
+    def resolve(self, host: str, port: int = None) -> Tuple[str, ...]:
+        """
+        Resolve a host, using the cache if possible.
+
+        Parameters
+        ----------
+        host : str
+            The hostname to resolve.
+        port : int, default=None
+            The port that will be connected to.
+
+        Returns
+        -------
+        tuple[str, ...]
+            The addresses of the host, in the order returned by the resolver.
+        """
+
+        now = time()
+        entry = self._local.get(host)
+        if entry is None or entry[0] < now:
+            # the shared store is behind a manager, so only ask it when the local copy is outdated
+            entry = self._store.get(host)
+            if entry is None or entry[0] < now:
+                addresses = socket.getaddrinfo(host, port, connection.allowed_gai_family(), socket.SOCK_STREAM)
+                entry = (now + self.ttl, tuple(dict.fromkeys(sockaddr[0] for *_, sockaddr in addresses)))
+                self._store[host] = entry
+            self._local[host] = entry
+        return entry[1]
+
+    def install(self):
+        """Make urllib3 use this cache for all new connections in the current process."""
+        connection.create_connection = self.create_connection
+
+    @staticmethod
+    def uninstall():
+        """Restore urllib3's own name resolution in the current process."""
+        connection.create_connection = _create_connection
+
+    def create_connection(self, address: Tuple[str, int], *args, **kwargs) -> socket.socket:
+        """Drop-in replacement for :func:`urllib3.util.connection.create_connection`."""
+        host, port = address
+        host = host.strip('[]')
+        if is_ipaddress(host):
+            return _create_connection(address, *args, **kwargs)
+
+        err = None
+        for ip in self.resolve(host, port):
+            try:
+                return _create_connection((ip, port), *args, **kwargs)
+            except OSError as e:
+                err = e
+        if err is not None:
+            raise err
+        raise OSError('getaddrinfo returns an empty list')
@@ -0,0 +1,185 @@
+import os
+from array import array
+from multiprocessing import Lock
+from time import time
+
+# records are 64-bit request ids, with the highest bit marking completion
+_COMPLETED = 1 << 63
+# the largest id the bitmap index accepts, which then takes up 512 MiB
+MAX_ID = (1 << 32) - 1
+_CHUNK_SIZE = 1 << 23
+_LOCK_TIMEOUT = 5
+
+
+class Journal:
+    """An append-only journal of completed request ids, used to resume interrupted runs."""
+
+    def __init__(self,
+                 path: str,
+                 *,
+                 batch_size: int = 1024,
+                 flush_interval: float = 1,
+                 checkpoint_interval: float = 60,
+                 fsync: bool = True) -> None:
+        """
+        Initialise a Journal.
+
+        Parameters
+        ----------
+        path : str
+            The path of the journal. The index of completed ids is kept next to it, at ``path + '.index'``.
+        batch_size : int, default=1024
+            The number of records to collect before writing them at once.
+        flush_interval : float, default=1
+            The maximum time (in seconds) to hold records back.
+        checkpoint_interval : float, default=60
+            The time (in seconds) between merging the journal into the index during a run.
+        fsync : bool, default=True
+            Whether to sync every write to disk.
+
+        Note
+        ----
+            Completed ids are indexed in a bitmap, so ids have to be integers in ``[0, MAX_ID]`` and should be dense
+            (like a counter). The bitmap takes up one bit per id up to the largest one.
+        """
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync = fsync
+        self._completed = bytearray()
+        self._buffer = array('Q')
+        self._last_flush = time()
+        # held while writing, so the journal can be rotated away from under the writers
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # other processes only write to the journal, they don't need the index or pending records
+        state = self.__dict__.copy()
+        state.update(_completed=bytearray(), _buffer=array('Q'))
+        return state
+
+    @property
+    def index_path(self) -> str:
+        """The path of the index of completed ids."""
+        return self.path + '.index'
+
+    @property
+    def _rotated_path(self) -> str:
+        return self.path + '.old'
+
+    def load(self) -> 'Journal':
+        """Read the index and merge the journal into it."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                self._completed = bytearray(f.read())
+        self.checkpoint()
+        return self
+
+    def is_completed(self, id: int) -> bool:
+        """
+        Check whether a request has been completed.
+
+        Raises
+        ------
+        ValueError
+            If the id can't be journaled.
+        """
+
+        _check_id(id)
+        return id >> 3 < len(self._completed) and bool(self._completed[id >> 3] >> (id & 7) & 1)
+
+    def completed(self, id: int):
+        """Record that a request has been completed."""
+        _check_id(id)
+        self._append(id | _COMPLETED)
+
+    def flush(self):
+        """Write all pending records at once."""
+        self._last_flush = time()
+        if not self._buffer:
+            return
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, self._buffer.tobytes())
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        del self._buffer[:]
+
+    def checkpoint(self):
+        """Merge the journal into the index and start a new one. Safe to call while other processes are writing."""
+        self.flush()
+        # finish a checkpoint that was interrupted before the rotated journal could be renamed over
+        self._merge_rotated()
+        # a writer that was terminated while writing never releases the lock, so don't wait for it forever
+        if not self._lock.acquire(timeout=_LOCK_TIMEOUT):
+            return
+        try:
+            if os.path.exists(self.path):
+                os.replace(self.path, self._rotated_path)
+        finally:
+            self._lock.release()
+        self._merge_rotated()
+
+    def close(self):
+        """Write all pending records."""
+        self.flush()
+
+    def _append(self, record: int):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size or time() - self._last_flush > self.flush_interval:
+            self.flush()
+
+    def _merge_rotated(self):
+        if not os.path.exists(self._rotated_path):
+            return
+        self._replay(self._rotated_path)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self._completed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+        # replaying records that are already in the index is harmless, so a crash before this loses nothing
+        os.remove(self._rotated_path)
+
+    def _replay(self, path: str):
+        completed = self._completed
+        rest = b''
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(_CHUNK_SIZE)
+                if not chunk:
+                    # a crash can leave a partially written record at the end, it is dropped
+                    break
+                data = rest + chunk
+                size = len(data) - len(data) % 8
+                rest = data[size:]
+                records = array('Q', data[:size])
+                if not records:
+                    continue
+                top = max(records)
+                if top < _COMPLETED:
+                    continue
+                if top ^ _COMPLETED > MAX_ID:
+                    # skip ids the index can't hold instead of failing every load from now on
+                    records = array('Q', (record for record in records if record ^ _COMPLETED <= MAX_ID))
+                    if not records:
+                        continue
+                    top = max(records)
+                # grow the bitmap once per chunk, instead of once per record
+                length = ((top ^ _COMPLETED) >> 3) + 1
+                if length > len(completed):
+                    completed.extend(bytes(length - len(completed)))
+                for record in filter(_COMPLETED.__le__, records):
+                    id = record ^ _COMPLETED
+                    completed[id >> 3] |= 1 << (id & 7)
+
+
+def _check_id(id: int):
+    if not isinstance(id, int) or not 0 <= id <= MAX_ID:
+        raise ValueError(f'Journaled request ids must be integers in [0, {MAX_ID}], got {id!r}')
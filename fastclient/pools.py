@@ -1,17 +1,20 @@
 from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Value
 from multiprocessing.connection import Connection, Pipe
-from typing import Mapping
+from typing import Iterable, Mapping
 
 from urllib3 import PoolManager, ProxyManager
 from urllib3.contrib.socks import SOCKSProxyManager
 from urllib3.response import HTTPResponse
+from urllib3.util.proxy import connection_requires_http_tunnel
 
 from fastclient.types import Request, Response
 
 
 class RequestPool:
-    def __init__(self, headers: Mapping[str, str] = None, id_: int = None):
+    def __init__(
+            self, headers: Mapping[str, str] = None, id_: int = None, warmup: Iterable[str] = None,
+            warmup_connections: int = None, warmup_timeout: float = 3):
         """
         Initialise a RequestPool.
 
@@ -21,10 +24,19 @@ class RequestPool:
             The headers to use by default
         id_ : int, default=None
             The pool's id (used for ratelimit-grouping)
+        warmup : Iterable[str], default=None
+            The urls of the hosts to open connections to when setting up
+        warmup_connections : int, default=None
+            The number of connections to open per host (defaults to the maximum number of connections)
+        warmup_timeout : float, default=3
+            The time (in seconds) to wait for a connection to open when warming up
         """
 
         self.headers = headers
         self.id_ = id_
+        self.warmup = warmup
+        self.warmup_connections = warmup_connections
+        self.warmup_timeout = warmup_timeout
         self._cpool = None
         self._tpool = None
         self._remaining_tasks = None
@@ -52,6 +64,7 @@ class RequestPool:
         self._remaining_tasks = Value('L', 0)
         (conn1, conn2) = Pipe(duplex=False)
         self._sendpipe = conn2
+        self._warmup(max_connections)
         return conn1
 
     def _request(self, request: Request):
@@ -74,6 +87,41 @@ class RequestPool:
                                     request.store)
         future.add_done_callback(RequestPool._handle_future)
 
+    def _warmup(self, max_connections: int):
+        """
+        Open keep-alive connections to the hosts in :attr:`warmup`.
+
+        Parameters
+        ----------
+        max_connections : int
+            The maximum number of connections per host.
+
+        Note
+        ----
+            Connections that fail to open are left to be reopened by the first request using them. Urls that can't be
+            warmed up at all are skipped.
+        """
+
+        if not self.warmup:
+            return
+        # max_connections defaults to the rate, which doesn't have to be an integer
+        num_connections = max(1, int(min(self.warmup_connections or max_connections, max_connections)))
+        for url in self.warmup:
+            pool, conns = None, []
+            try:
+                pool = self._cpool.connection_from_url(url)
+                for _ in range(num_connections):
+                    conns.append(pool._get_conn())
+                for future in [self._tpool.submit(RequestPool._connect, pool, conn, self.warmup_timeout)
+                               for conn in conns]:
+                    future.exception()
+            except Exception:
+                continue
+            finally:
+                # the pool blocks when it runs out of connections, so always hand them back
+                for conn in conns:
+                    pool._put_conn(conn)
+
     def _get_remaining_tasks(self) -> int:
         """Get the number of remaining tasks."""
         return self._remaining_tasks.value
@@ -90,6 +138,15 @@ class RequestPool:
         except Exception as e:
             return sendpipe, remaining_tasks, e
 
+    @staticmethod
+    def _connect(pool, conn, timeout: float):
+        # every request sets its own timeout again, so this only applies to warming up
+        conn.timeout = timeout
+        if pool.proxy is not None and connection_requires_http_tunnel(pool.proxy, pool.proxy_config, pool.scheme):
+            pool._prepare_proxy(conn)
+        else:
+            conn.connect()
+
     @staticmethod
     def _handle_future(future):
         sendpipe, remaining_tasks, res = future.result()
@@ -100,7 +157,8 @@ class RequestPool:
 class ProxyRequestPool(RequestPool):  # TODO test
     def __init__(
             self, proxy_url: str, headers: Mapping[str, str] = None, proxy_headers: Mapping[str, str] = None,
-            proxy_ssl_context=None, use_forwarding_for_https: bool = False, id_: int = None):
+            proxy_ssl_context=None, use_forwarding_for_https: bool = False, id_: int = None,
+            warmup: Iterable[str] = None, warmup_connections: int = None, warmup_timeout: float = 3):
         """
         Initialise a ProxyRequestPool.
 
@@ -118,6 +176,12 @@ class ProxyRequestPool(RequestPool):  # TODO test
             The HTTPS request will originate from the proxy and will not be made via a prior established tunnel
         id_ : int, default=None
             The pool's id (used for ratelimit-grouping)
+        warmup : Iterable[str], default=None
+            The urls of the hosts to open connections to when setting up
+        warmup_connections : int, default=None
+            The number of connections to open per host (defaults to the maximum number of connections)
+        warmup_timeout : float, default=3
+            The time (in seconds) to wait for a connection to open when warming up
         """
 
         self.proxy_url = proxy_url
@@ -126,6 +190,9 @@ class ProxyRequestPool(RequestPool):  # TODO test
         self.proxy_ssl_context = proxy_ssl_context
         self.use_forwarding_for_https = use_forwarding_for_https
         self.id_ = id_
+        self.warmup = warmup
+        self.warmup_connections = warmup_connections
+        self.warmup_timeout = warmup_timeout
         self._cpool = None
         self._tpool = None
         self._remaining_tasks = None
@@ -154,13 +221,14 @@ class ProxyRequestPool(RequestPool):  # TODO test
         self._remaining_tasks = Value('L', 0)
         (conn1, conn2) = Pipe(duplex=False)
         self._sendpipe = conn2
+        self._warmup(max_connections)
         return conn1
 
 
 class SOCKSProxyRequestPool(RequestPool):
     def __init__(
             self, proxy_url: str, username: str = None, password: str = None, headers: Mapping[str, str] = None, id_:
-            int = None):
+            int = None, warmup: Iterable[str] = None, warmup_connections: int = None, warmup_timeout: float = 3):
         """
         Initialise a RequestPool.
 
@@ -176,6 +244,12 @@ class SOCKSProxyRequestPool(RequestPool):
             The headers to use by default
         id_ : int, default=None
             The pool's id (used for ratelimit-grouping)
+        warmup : Iterable[str], default=None
+            The urls of the hosts to open connections to when setting up
+        warmup_connections : int, default=None
+            The number of connections to open per host (defaults to the maximum number of connections)
+        warmup_timeout : float, default=3
+            The time (in seconds) to wait for a connection to open when warming up
         """
 
         self.proxy_url = proxy_url
@@ -183,6 +257,9 @@ class SOCKSProxyRequestPool(RequestPool):
         self.password = password
         self.headers = headers
         self.id_ = id_
+        self.warmup = warmup
+        self.warmup_connections = warmup_connections
+        self.warmup_timeout = warmup_timeout
         self._cpool = None
         self._tpool = None
         self._remaining_tasks = None
@@ -211,4 +288,5 @@ class SOCKSProxyRequestPool(RequestPool):
         self._remaining_tasks = Value('L', 0)
         (conn1, conn2) = Pipe(duplex=False)
         self._sendpipe = conn2
+        self._warmup(max_connections)
         return conn1
@@ -0,0 +1,154 @@
+import os
+import socket
+import unittest
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Client
+from tempfile import TemporaryDirectory
+from time import sleep, time
+
+from fastclient import FastClient
+from fastclient.coordinator import Coordinator, LeaseClient
+
+
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = Coordinator(rates={'api': 100}, lease_time=0.1).start()
+
+    def tearDown(self):
+        self.coordinator.close()
+
+    def test_lease_is_limited(self):
+        clients = [LeaseClient(self.coordinator.address, 'api', 100) for _ in range(3)]
+        granted = sum(client.lease()[1] for client in clients)
+        self.assertLessEqual(granted, 10)  # one lease window's worth shared between all clients
+        for client in clients:
+            client.close()
+
+    def test_dead_client_is_recovered(self):
+        coordinator = Coordinator(rates={'api': 10}, lease_time=1).start()
+        client = LeaseClient(coordinator.address, 'api', 10)
+        self.assertEqual(client.lease()[1], 10)
+        client.close()
+        sleep(0.05)  # wait for the coordinator to notice
+        other = LeaseClient(coordinator.address, 'api', 10)
+        # the refill alone would only allow 0 tokens, recovery gives back the unspent ~9
+        self.assertGreaterEqual(other.lease()[1], 8)
+        other.close()
+        coordinator.close()
+
+    def test_release(self):
+        client = LeaseClient(self.coordinator.address, 'api', 100)
+        lease_id, granted, *_ = client.lease()
+        client.release(lease_id, granted)
+        self.assertGreaterEqual(client.lease()[1], granted)  # assert released tokens can be leased again
+        client.close()
+
+    def test_malformed_message(self):
+        conn = Client(self.coordinator.address)
+        conn.send('garbage')
+        conn.send(('lease', 'api', 100, -5))
+        conn.send(('lease', 'api', 100, 1))
+        self.assertTrue(conn.poll(1))
+        self.assertEqual(conn.recv()[1], 1)  # assert the bad messages were dropped and the connection still works
+        conn.close()
+
+    def test_unreachable(self):
+        address = self.coordinator.address
+        self.coordinator.close()
+        client = LeaseClient(address, 'api', 100)
+        self.assertIsNone(client.lease())
+
+    def test_wait(self):
+        client = LeaseClient(self.coordinator.address, 'slow', 1)
+        self.assertEqual(client.lease()[1], 1)
+        _, granted, _, wait = client.lease()
+        self.assertEqual(granted, 0)
+        self.assertAlmostEqual(wait, 1, delta=0.1)  # assert starved clients are told when to come back
+        client.close()
+
+    def test_silent_peer(self):
+        coordinator = Coordinator(authkey=b'secret').start()
+        with socket.create_connection(coordinator.address):  # connects, but never answers the challenge
+            client = LeaseClient(coordinator.address, 'api', 100, authkey=b'secret')
+            self.assertIsNotNone(client.lease())  # assert others can still connect
+            client.close()
+        coordinator.close()
+
+    def test_authkey_required(self):
+        with self.assertRaises(ValueError):
+            Coordinator(('0.0.0.0', 0))
+        Coordinator(('0.0.0.0', 0), authkey=b'secret').close()
+        coordinator = Coordinator(('0.0.0.0', 0), authkey=b'secret').start()
+        client = LeaseClient(('127.0.0.1', coordinator.address[1]), 'api', 100, authkey=b'secret')
+        self.assertIsNotNone(client.lease())
+        client.close()
+        coordinator.close()
+
+
+def serve(address):
+    Coordinator(address, {'api': 20}).serve_forever()
+
+
+class TicketTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.address = os.path.join(self.dir.name, 'coordinator')
+        self.coordinator = None
+
+    def tearDown(self):
+        self.stop_coordinator()
+        self.dir.cleanup()
+
+    def start_coordinator(self):
+        # run it in its own process, like on another node
+        self.coordinator = Process(target=serve, args=(self.address,), daemon=True)
+        self.coordinator.start()
+        while not os.path.exists(self.address):
+            sleep(0.01)
+
+    def stop_coordinator(self):
+        if self.coordinator is not None:
+            self.coordinator.terminate()
+            self.coordinator.join()
+            self.coordinator = None
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+    def count_tickets(self, recv, duration):
+        end = time() + duration
+        count = 0
+        while time() < end:
+            if recv.poll(0.01):
+                recv.recv()
+                count += 1
+        return count
+
+    def test_create_tickets(self):
+        self.start_coordinator()
+        recv, send = Pipe(duplex=False)
+        tickets = Process(target=FastClient._create_tickets, args=(50, [send], self.address, 'api', None, 10),
+                          daemon=True)
+        tickets.start()
+        try:
+            self.assertAlmostEqual(self.count_tickets(recv, 2), 40, delta=8)  # the coordinator's rate applies
+
+            self.stop_coordinator()
+            self.count_tickets(recv, 0.5)
+            self.assertAlmostEqual(self.count_tickets(recv, 2), 20, delta=5)  # falls back to the fallback rate
+
+            self.start_coordinator()
+            self.count_tickets(recv, 1.5)  # wait for the retry interval
+            self.assertAlmostEqual(self.count_tickets(recv, 2), 40, delta=8)  # reconnects to the coordinator
+        finally:
+            tickets.terminate()
+            tickets.join()
+
+    def test_no_fallback(self):
+        recv, send = Pipe(duplex=False)
+        tickets = Process(target=FastClient._create_tickets, args=(50, [send], self.address, 'api'), daemon=True)
+        tickets.start()
+        try:
+            self.assertEqual(self.count_tickets(recv, 1), 0)  # assert nothing is sent without a fallback rate
+        finally:
+            tickets.terminate()
+            tickets.join()
@@ -0,0 +1,33 @@
+import unittest
+from socket import socket
+from unittest import mock
+
+from fastclient.dns import DNSCache
+
+
+class DNSCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.store = {}
+        self.cache = DNSCache(self.store, ttl=60)
+
+    def test_resolve_is_cached(self):
+        addresses = self.cache.resolve('localhost', 80)
+        self.assertIn('localhost', self.store)  # assert the result is shared
+        with mock.patch('socket.getaddrinfo') as getaddrinfo:
+            self.assertEqual(self.cache.resolve('localhost', 80), addresses)
+            getaddrinfo.assert_not_called()
+
+    def test_shared_store(self):
+        self.store['example.invalid'] = (float('inf'), ('127.0.0.1',))
+        self.assertEqual(DNSCache(self.store).resolve('example.invalid'), ('127.0.0.1',))
+
+    def test_ttl(self):
+        self.store['localhost'] = (0, ('192.0.2.1',))  # expired entry
+        self.assertNotIn('192.0.2.1', self.cache.resolve('localhost', 80))
+
+    def test_create_connection(self):
+        with socket() as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            self.store['example.invalid'] = (float('inf'), ('127.0.0.1',))
+            self.cache.create_connection(('example.invalid', server.getsockname()[1])).close()
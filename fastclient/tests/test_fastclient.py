@@ -1,7 +1,13 @@
+import os
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from threading import Thread
+
 from fastclient import FastClient
+from fastclient.journal import Journal
 
-from fastclient.pools import RequestPool
+from fastclient.pools import ProxyRequestPool, RequestPool
 from fastclient.types import Request, RequestEvent
 
 
@@ -16,3 +22,55 @@ class PoolTest(unittest.TestCase):
         fastclient.on(RequestEvent.RESPONSE, cb)
         fastclient.run()
         self.assertLessEqual(fastclient['rps'], 50)
+
+
+class ResumeTest(unittest.TestCase):
+    def test_request(self):
+        with TemporaryDirectory() as dir:
+            journal = Journal(os.path.join(dir, 'journal'))
+            journal.completed(1)
+            journal.close()
+            fastclient = FastClient(50, [RequestPool()], journal=journal.path)
+            fastclient.request(Request('GET', 'https://httpbin.org/get', id=1))
+            self.assertTrue(fastclient._requests.empty())  # assert completed requests are skipped
+            for id in (-1, 'a', 1 << 63, 1_700_000_000_000):
+                with self.assertRaises(ValueError):
+                    fastclient.request(Request('GET', 'https://httpbin.org/get', id=id))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def count(_r, c):
+    c['store']['count'] += 1
+
+
+class SetupTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_failed_setup(self):
+        fastclient = FastClient(100, [RequestPool(), ProxyRequestPool('ftp://bad:1', id_=5)])
+        fastclient['count'] = 0
+        for i in range(20):
+            fastclient.request(Request('GET', f'http://127.0.0.1:{self.server.server_port}/', id=i))
+        fastclient.on(RequestEvent.RESPONSE, count)
+        run = Thread(target=fastclient.run, daemon=True)
+        run.start()
+        run.join(30)
+        self.assertFalse(run.is_alive())  # assert the run doesn't hang on the failed controller
+        self.assertEqual(fastclient['count'], 20)  # assert the healthy controller served all requests
@@ -0,0 +1,105 @@
+import os
+import unittest
+from array import array
+from multiprocessing import Process
+from tempfile import TemporaryDirectory
+
+from fastclient.journal import MAX_ID, Journal, _COMPLETED
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_resume(self):
+        journal = Journal(self.path)
+        for id in range(0, 10, 2):
+            journal.completed(id)
+        journal.close()
+        journal = Journal(self.path).load()
+        self.assertEqual([id for id in range(10) if journal.is_completed(id)], [0, 2, 4, 6, 8])
+        self.assertFalse(journal.is_completed(1000))  # assert ids beyond the index aren't completed
+
+    def test_group_commit(self):
+        journal = Journal(self.path, batch_size=4, flush_interval=60)
+        for id in range(3):
+            journal.completed(id)
+        self.assertFalse(os.path.exists(self.path))  # assert records are held back
+        journal.completed(3)
+        self.assertEqual(os.path.getsize(self.path), 32)  # assert the batch is written at once
+        journal.close()
+
+    def test_checkpoint(self):
+        journal = Journal(self.path)
+        journal.completed(42)
+        journal.checkpoint()
+        self.assertFalse(os.path.exists(self.path))  # assert a new journal is started
+        self.assertTrue(Journal(self.path).load().is_completed(42))
+
+    def test_partial_record(self):
+        journal = Journal(self.path)
+        journal.completed(7)
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01\x02\x03')
+        journal = Journal(self.path).load()
+        self.assertTrue(journal.is_completed(7))
+        journal.completed(8)
+        journal.close()
+        # assert new records aren't misaligned by the partial one
+        self.assertTrue(Journal(self.path).load().is_completed(8))
+
+    def test_interrupted_checkpoint(self):
+        journal = Journal(self.path)
+        journal.completed(1)
+        journal.close()
+        os.replace(self.path, self.path + '.old')  # crashed right after rotating
+        journal.completed(2)
+        journal.close()
+        journal = Journal(self.path).load()
+        self.assertTrue(journal.is_completed(1))
+        self.assertTrue(journal.is_completed(2))
+
+    def test_concurrent_checkpoint(self):
+        journal = Journal(self.path, batch_size=10)
+        writer = Process(target=write, args=(journal, 10000))
+        writer.start()
+        while writer.is_alive():
+            journal.checkpoint()
+        writer.join()
+        journal.checkpoint()
+        self.assertTrue(all(journal.is_completed(id) for id in range(10000)))  # assert no records were lost
+
+    def test_invalid_ids(self):
+        journal = Journal(self.path)
+        journal.completed(3)
+        for id in (-1, '3', 1 << 63, 1.0, MAX_ID + 1):
+            with self.assertRaises(ValueError):
+                journal.is_completed(id)
+            with self.assertRaises(ValueError):
+                journal.completed(id)
+
+    def test_sparse_large_id(self):
+        journal = Journal(self.path)
+        with self.assertRaises(ValueError):
+            journal.completed(1_700_000_000_000)  # a millisecond timestamp doesn't fit the index
+        self.assertFalse(journal.is_completed(MAX_ID))  # assert the largest id is accepted
+        journal.completed(1)
+        journal.close()
+        # a record the index can't hold, written by something else
+        with open(self.path, 'ab') as f:
+            f.write(array('Q', [1_700_000_000_000 | _COMPLETED, 5 | _COMPLETED]).tobytes())
+        journal = Journal(self.path).load()
+        self.assertTrue(journal.is_completed(1))
+        self.assertTrue(journal.is_completed(5))
+        self.assertTrue(Journal(self.path).load().is_completed(5))  # assert the job can still be resumed
+
+
+def write(journal, n):
+    for id in range(n):
+        journal.completed(id)
+    journal.close()
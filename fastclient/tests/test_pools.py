@@ -1,4 +1,7 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from multiprocessing.connection import Connection
+from socket import socket
+from time import time
 import unittest
 
 from fastclient.pools import RequestPool
@@ -19,3 +22,55 @@ class PoolTest(unittest.TestCase):
         response = self.conn.recv()
         self.assertEqual(response.status, 200)  # assert a response of 200
         self.assertEqual(response.id, 999)  # assert the id is carried
+
+
+class WarmupTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self):
+        self.server.server_close()
+
+    def test_warmup(self):
+        pool = RequestPool(warmup=[self.url], warmup_connections=2)
+        pool._setup(8, 8)
+        cpool = pool._cpool.connection_from_url(self.url)
+        connected = [conn for conn in cpool.pool.queue if conn is not None and conn.sock is not None]
+        self.assertEqual(len(connected), 2)  # assert the connections were opened
+        pool._teardown()
+
+    def test_warmup_refused(self):
+        with socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            url = f'http://127.0.0.1:{sock.getsockname()[1]}'  # nothing listens here
+        pool = RequestPool(warmup=[url, self.url], warmup_connections=2)
+        pool._setup(8, 8)
+        cpool = pool._cpool.connection_from_url(self.url)
+        connected = [conn for conn in cpool.pool.queue if conn is not None and conn.sock is not None]
+        self.assertEqual(len(connected), 2)  # assert the other hosts are still warmed up
+        pool._teardown()
+
+    def test_warmup_timeout(self):
+        with socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            sock.listen()
+            # accepts the connection, but never answers the tls handshake
+            pool = RequestPool(warmup=[f'https://127.0.0.1:{sock.getsockname()[1]}'], warmup_timeout=0.5)
+            start = time()
+            pool._setup(8, 8)
+            self.assertLess(time() - start, 2)  # assert setup doesn't hang
+            pool._teardown()
+
+    def test_warmup_float_connections(self):
+        pool = RequestPool(warmup=[self.url])
+        pool._setup(8, 0.5)  # max_connections defaults to the rate, which can be a float
+        pool._teardown()
+
+    def test_warmup_bad_url(self):
+        pool = RequestPool(warmup=['ftp://bad:1', self.url], warmup_connections=2)
+        pool._setup(8, 8)
+        cpool = pool._cpool.connection_from_url(self.url)
+        connected = [conn for conn in cpool.pool.queue if conn is not None and conn.sock is not None]
+        self.assertEqual(len(connected), 2)  # assert the other urls are still warmed up
+        pool._teardown()